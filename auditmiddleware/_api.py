@@ -12,12 +12,12 @@
 
 """This package contains the logic for creating events from API requests."""
 
-import collections
 import hashlib
 import json
 import os
 import re
 import six
+from six.moves import intern
 import socket
 import uuid
 import yaml
@@ -31,20 +31,62 @@ from pycadf import host
 from pycadf import reason
 from pycadf import resource
 
-ResourceSpec = collections.namedtuple('ResourceSpec',
-                                      ['type_name', 'el_type_name',
-                                       'type_uri', 'el_type_uri', 'singleton',
-                                       'id_field', 'name_field',
-                                       'custom_actions', 'custom_attributes',
-                                       'children', 'payloads'])
-
-# default mappings from HTTP methods to CADF actions
+try:
+    # prefer the libyaml based loader if available
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+class ResourceSpec(object):
+    """Descriptor of a resource type as declared in the mapping file."""
+
+    __slots__ = ('type_name', 'el_type_name', 'type_uri', 'el_type_uri',
+                 'singleton', 'id_field', 'name_field', 'custom_actions',
+                 'custom_attributes', 'children', 'payloads',
+                 'wildcard_actions')
+
+    def __init__(self, type_name, el_type_name, type_uri, el_type_uri,
+                 singleton, id_field, name_field, custom_actions,
+                 custom_attributes, children, payloads):
+        """Initialize the descriptor from the parsed mapping entry."""
+        self.type_name = type_name
+        self.el_type_name = el_type_name
+        self.type_uri = type_uri
+        self.el_type_uri = el_type_uri
+        self.singleton = singleton
+        self.id_field = id_field
+        self.name_field = name_field
+        self.custom_actions = custom_actions
+        # generic action mappings ("<method>:*" rules) by HTTP method
+        self.wildcard_actions = dict(
+            (rule[:-2], action)
+            for rule, action in six.iteritems(custom_actions)
+            if rule.endswith(':*'))
+        self.custom_attributes = custom_attributes
+        self.children = children
+        self.payloads = payloads
+
+    def __repr__(self):
+        """Identify the descriptor by its type URI."""
+        return 'ResourceSpec(type_uri=%r)' % self.type_uri
+
+
+# default mappings from HTTP methods to CADF actions for operations on
+# individual resources (or singletons) ...
 _method_action_map = {'GET': taxonomy.ACTION_READ,
                       'HEAD': taxonomy.ACTION_READ,
                       'PUT': taxonomy.ACTION_UPDATE,
-                      'PATCH': taxonomy.ACTION_UPDATE, 'POST':
-                          taxonomy.ACTION_CREATE,
+                      'PATCH': taxonomy.ACTION_UPDATE,
+                      'POST': taxonomy.ACTION_UPDATE,
                       'DELETE': taxonomy.ACTION_DELETE}
+# ... and for operations on collections of resources
+_collection_method_action_map = {'GET': taxonomy.ACTION_LIST,
+                                 'HEAD': taxonomy.ACTION_LIST,
+                                 'PUT': taxonomy.ACTION_UPDATE,
+                                 'PATCH': taxonomy.ACTION_UPDATE,
+                                 'POST': taxonomy.ACTION_CREATE,
+                                 'DELETE': taxonomy.ACTION_DELETE}
 # action suffixes for operations on custom keys (modelled as path suffixes)
 _key_action_suffix_map = {taxonomy.ACTION_READ: '/get',
                           taxonomy.ACTION_UPDATE: '/set',
@@ -54,6 +96,21 @@ _key_action_suffix_map = {taxonomy.ACTION_READ: '/get',
 # matcher for UUIDs
 _UUID_RE = re.compile("[0-9a-f-]+$")
 
+# matcher for path segments that are certainly IDs (not resource names), a
+# subset of what _UUID_RE matches
+_ID_RE = re.compile("(?:[0-9a-f-]{8,}|[0-9]+)$")
+
+# maximum number of cached parsing results of URL paths
+_PATH_CACHE_SIZE = 1024
+
+# parsed mapping files by absolute path along with their modification time,
+# shared by all middleware instances of the process
+_audit_map_cache = {}
+
+
+def _segment_at(segments, pos):
+    return segments[pos] if pos is not None else None
+
 
 def _make_uuid(s):
     if s.isdigit():
@@ -126,23 +183,44 @@ def _make_tags(ev):
 class OpenStackAuditMiddleware(object):
     """The actual middleware implementation, a filter for the paste pipe."""
 
+    # the factory is stateless, so it can be shared by all events
+    _event_factory = eventfactory.EventFactory()
+
     def __init__(self, cfg_file, payloads_enabled, metrics_enabled,
                  log=logging.getLogger(__name__)):
         """Configure to recognize and map known API paths."""
         self._log = log
 
         try:
-            with open(cfg_file, 'r') as f:
-                conf = yaml.safe_load(f)
-
             self._payloads_enabled = payloads_enabled
-            self._service_type = conf['service_type']
-            self._service_name = conf.get('service_name', self._service_type)
-            self._service_id = self._build_service_id(self._service_name)
-            self._prefix_re = re.compile(conf['prefix'])
-            # default_target_endpoint_type = conf.get('target_endpoint_type')
-            # self._service_endpoints = conf.get('service_endpoints', {})
-            self._resource_specs = self._build_audit_map(conf['resources'])
+
+            # reuse what has been parsed already unless the file changed
+            cache_key = os.path.abspath(cfg_file)
+            st = os.stat(cfg_file)
+            # st_mtime_ns is not available on Python 2.7
+            mtime = getattr(st, 'st_mtime_ns', st.st_mtime)
+            cached = _audit_map_cache.get(cache_key)
+            if cached and cached[0] == mtime:
+                (_, self._service_type, self._service_name, self._service_id,
+                 self._prefix_re, self._resource_specs, self._routes,
+                 self._path_cache, self._registered_resources) = cached
+            else:
+                self._load_audit_map(cfg_file)
+                # replaces the outdated entry (if any)
+                _audit_map_cache[cache_key] = (mtime,
+                                               self._service_type,
+                                               self._service_name,
+                                               self._service_id,
+                                               self._prefix_re,
+                                               self._resource_specs,
+                                               self._routes,
+                                               self._path_cache,
+                                               self._registered_resources)
+
+            # project needs to be specified in a named group in order to be
+            # detected
+            self._prefix_has_project = \
+                'project_id' in self._prefix_re.groupindex
 
         except KeyError as err:
             raise ConfigError('Missing config property in %s: %s', cfg_file,
@@ -151,9 +229,33 @@ class OpenStackAuditMiddleware(object):
             raise ConfigError('Error opening config file %s: %s',
                               cfg_file, str(err))
 
+        # the observer is the same for all events
+        self._observer = self._create_observer_resource()
+
         self._statsd = self._create_statsd_client() \
             if metrics_enabled else None
 
+    def _load_audit_map(self, cfg_file):
+        """Parse the mapping file and build the resource hierarchy from it."""
+        # let the loader read and decode the raw stream itself
+        with open(cfg_file, 'rb') as f:
+            conf = yaml.load(f, Loader=_YamlLoader)  # nosec
+
+        self._service_type = conf['service_type']
+        self._service_name = conf.get('service_name', self._service_type)
+        self._service_id = self._build_service_id(self._service_name)
+        self._prefix_re = re.compile(conf['prefix'])
+        # default_target_endpoint_type = conf.get('target_endpoint_type')
+        # self._service_endpoints = conf.get('service_endpoints', {})
+        self._resource_specs = self._build_audit_map(conf['resources'])
+        self._routes = {}
+        for name, res_spec in six.iteritems(self._resource_specs):
+            self._build_routes(self._routes, res_spec, (name,), None)
+        self._path_cache = {}
+        # number of resources registered on demand into the resource tree
+        # (in a list, so that it is shared along with the tree)
+        self._registered_resources = [0]
+
     def _create_statsd_client(self):
         """Create the statsd client (if datadog package is present)."""
         try:
@@ -183,7 +285,7 @@ class OpenStackAuditMiddleware(object):
                                                        s)
 
             # ensure that cust
-            result[rest_name] = res_spec
+            result[intern(rest_name)] = res_spec
 
         return result
 
@@ -213,7 +315,9 @@ class OpenStackAuditMiddleware(object):
             type_name = rest_name.replace('-', '_')
             if type_name.startswith('os_'):
                 type_name = type_name[3:]
-        type_uri = spec.get('type_uri', pfx + "/" + name)
+        # type URIs are shared by many resources and events, and live as long
+        # as the process
+        type_uri = intern(spec.get('type_uri', pfx + "/" + name))
         el_type_name = None
         el_type_uri = None
         childs_parent_type_uri = None
@@ -221,7 +325,7 @@ class OpenStackAuditMiddleware(object):
             # derive the name of the individual resource instances (elements)
             # by omitting the last character of the resource name
             el_type_name = spec.get('el_type_name', type_name[:-1])
-            el_type_uri = type_uri[:-1]
+            el_type_uri = intern(type_uri[:-1])
             childs_parent_type_uri = el_type_uri
         else:
             childs_parent_type_uri = type_uri
@@ -237,118 +341,197 @@ class OpenStackAuditMiddleware(object):
                                 payloads_config(spec.get('payloads')))
         return res_spec, rest_name
 
+    @staticmethod
+    def _build_routes(routes, res_spec, key, res_parent_id_pos):
+        """Precompute the parsing results for the paths of a resource.
+
+        This covers all paths addressing the resource and its children that
+        can be derived from the mapping file, with the IDs masked. Paths
+        with actions or keys are not covered, since their meaning might
+        change once unknown resources get registered on demand.
+
+        Parameters:
+            routes: dictionary to add the parsing results to
+            res_spec: resource descriptor addressed by the path
+            key: masked path segments addressing the resource
+            res_parent_id_pos: position of the parent resource's ID
+        """
+        if _ID_RE.match(key[-1]):
+            # would be interpreted as ID
+            return
+
+        routes[key] = (res_spec, None, res_parent_id_pos, None)
+        if not res_spec.singleton:
+            res_id_pos = len(key)
+            el_key = key + (None,)
+            routes[el_key] = (res_spec, res_id_pos, res_parent_id_pos, None)
+
+        for name, child_res in six.iteritems(res_spec.children):
+            OpenStackAuditMiddleware._build_routes(routes, child_res,
+                                                   key + (name,),
+                                                   res_parent_id_pos)
+            if not res_spec.singleton:
+                OpenStackAuditMiddleware._build_routes(routes, child_res,
+                                                       el_key + (name,),
+                                                       res_id_pos)
+
     def create_events(self, request, response=None):
         """Build a CADF event from request and response."""
         # drop the endpoint's path prefix
         path, target_project = self._handle_url_prefix(request)
-        if not path:
+        # normalize url: remove trailing slashes and .json suffix
+        path = (path or '').rstrip('/')
+        path = path[:-5] if path.endswith('.json') else path
+        # skip empty segments (i.e. around the leading / and duplicate ones)
+        segments = [s for s in path.split('/') if s]
+        if not segments:
             self._log.info("ignoring request with path: %s",
                            request.path)
             return None
 
-        # normalize url: remove trailing slash and .json suffix
-        path = path[:-1] if path.endswith('/') else path
-        path = path[:-5] if path.endswith('.json') else path
-        return self._build_events(target_project, self._resource_specs,
-                                  None, None, request, response, path, 0)
+        target = self._resolve_path(segments)
+        if not target:
+            self._log.warning("Unexpected continuation of resource path: %s",
+                              request.path)
+            return None
+
+        res_spec, res_id, res_parent_id, suffix = target
+        return self._create_events(target_project, res_spec, res_id,
+                                   res_parent_id, request, response, suffix)
+
+    def _resolve_path(self, segments):
+        """Determine the resource targeted by a URL path.
 
-    def _build_events(self, target_project, res_spec, res_id, res_parent_id,
-                      request, response, path, cursor=0):
-        """Parse a request recursively and builds CADF events from it.
+        Parsing results are looked up by path with the segments looking like
+        IDs masked, so that requests to the same kind of resource only need
+        to be parsed once, regardless of the actual resource IDs. Paths
+        derived from the mapping file are known in advance, others are
+        cached once parsed.
+
+        Parameters:
+            segments: URL path segments (without the prefix)
+        Returns:
+            tuple of resource spec, ID, parent ID and the path suffix (action
+            or key) or None if the path could not be parsed
+        """
+        key = tuple(None if _ID_RE.match(s) else s for s in segments)
+        registered = self._registered_resources[0]
+        route = self._routes.get(key)
+        if route is None:
+            # cached results are only valid if no resource has been
+            # registered since they were parsed
+            cached = self._path_cache.get(key)
+            if cached and cached[1] == registered:
+                route = cached[0]
+        if route is None:
+            id_positions = []
+            route = self._build_route(segments, id_positions)
+            # only cache the result if all masked segments have been
+            # interpreted as IDs and the resource tree did not change while
+            # parsing
+            masked_ids = sum(1 for pos in id_positions if key[pos] is None)
+            if route and masked_ids == key.count(None) and \
+                    registered == self._registered_resources[0]:
+                if len(self._path_cache) >= _PATH_CACHE_SIZE:
+                    self._path_cache.clear()
+                # a registration in the meantime invalidates the entry
+                self._path_cache[key] = (route, registered)
+
+        if not route:
+            return None
+
+        res_spec, res_id_pos, res_parent_id_pos, suffix_pos = route
+        return (res_spec, _segment_at(segments, res_id_pos),
+                _segment_at(segments, res_parent_id_pos),
+                _segment_at(segments, suffix_pos))
+
+    def _build_route(self, segments, id_positions):
+        """Parse a request path to find the targeted resource.
 
         This methods parses the URL path from left to right and builds the
-        resource hierarchy from it. The res_spec resource tree is used to
-        interpret the path segments properly, e.g. known when a path
-        segment represents a resource name, an ID or an attribute name.
+        resource hierarchy from it. The resource tree is used to interpret
+        the path segments properly, e.g. known when a path segment
+        represents a resource name, an ID or an attribute name.
 
         Parameters:
-            target_project: target project ID if specified in the path
-            res_spec: resource tree constructed from the mapping file
-            res_id: ID of the target resource
-            parent_res_id: ID of the parent resource of the target resource
-            request: incoming request to parse
-            response: resulting response to parse (e.g. to obtain results,
-                      just created resource IDs)
-            path: URL path being parsed
-            cursor: current position in the path as it is parsed
+            segments: URL path segments being parsed
+            id_positions: collects the position of each segment
+                          interpreted as ID
+        Returns:
+            tuple of resource spec and positions of the ID, parent ID and
+            suffix (action or key) in the path or None
         """
-        # Check if the end of path is reached and event can be created finally
-        if cursor == -1:
-            # end of path reached, create the event
-            return self._create_events(target_project, res_id,
-                                       res_parent_id,
-                                       res_spec, request, response)
-
-        # Find next path segment (skip leading / with +1)
-        next_pos = path.find('/', cursor + 1)
-        # token = scanned token (NOT keystone token)
-        token = None
-        if next_pos != -1:
-            # that means there are more path segments
-            token = path[cursor + 1:next_pos]
-        elif (cursor + 1) < len(path):
-            # last path segment found, not more '/' right of it
-            token = path[cursor + 1:]
-
-        # handle the current token
-        if isinstance(res_spec, dict):
-            # the resource tree node contains a dict => the token contains the
-            # top-level resource name
-            sub_res_spec = res_spec.get(token)
-            if sub_res_spec is None:
-                # create resource spec on demand using defaults
-                sub_res_spec = self.register_resource(None, token)
-                res_spec[token] = sub_res_spec
-
-            return self._build_events(target_project, sub_res_spec, None, None,
-                                      request,
-                                      response,
-                                      path, next_pos)
-        elif isinstance(res_spec, ResourceSpec):
-            # if the ID is set or it is a singleton, then the next token will
-            # be an action or child
-            if res_id or res_spec.singleton or token in res_spec.children:
-                child_res = res_spec.children.get(token)
-                if child_res:
-                    # the ID is still the one of the parent (or its parent if
-                    # the direct parent is a singleton)
-                    return self._build_events(target_project, child_res, None,
-                                              res_id or res_parent_id, request,
-                                              response, path, next_pos)
-            elif _UUID_RE.match(token):
-                # next up should be an ID (unless it is a known action)
-                return self._build_events(target_project, res_spec, token,
-                                          res_parent_id, request, response,
-                                          path, next_pos)
-
-            if next_pos == -1:
+        res_spec = self._resource_specs
+        res_id_pos = None
+        res_parent_id_pos = None
+        cursor = 0
+        while cursor < len(segments):
+            # token = scanned token (NOT keystone token)
+            token = segments[cursor]
+
+            # handle the current token
+            if isinstance(res_spec, dict):
+                # the resource tree node contains a dict => the token
+                # contains the top-level resource name
+                sub_res_spec = res_spec.get(token)
+                if sub_res_spec is None:
+                    # create resource spec on demand using defaults
+                    sub_res_spec = self.register_resource(res_spec, None,
+                                                          token)
+
+                res_spec = sub_res_spec
+                cursor += 1
+                continue
+            elif not isinstance(res_spec, ResourceSpec):
+                return None
+
+            # unless the ID is set or it is a singleton, the next token
+            # should be an ID (if it does not look like a child or action
+            # instead)
+            if res_id_pos is None and not res_spec.singleton and \
+                    (_ID_RE.match(token) or
+                     token not in res_spec.children and
+                     _UUID_RE.match(token)):
+                id_positions.append(cursor)
+                res_id_pos = cursor
+                cursor += 1
+                continue
+
+            child_res = res_spec.children.get(token)
+            if child_res:
+                # the ID is still the one of the parent (or its parent if
+                # the direct parent is a singleton)
+                if res_id_pos is not None:
+                    res_parent_id_pos = res_id_pos
+                res_id_pos = None
+                res_spec = child_res
+                cursor += 1
+                continue
+
+            if cursor == len(segments) - 1:
                 # last path segment --> token must be an action or a key
-                return self._create_events(target_project, res_id,
-                                           res_parent_id, res_spec, request,
-                                           response, token)
-            else:
-                # unknown resource name
-                # create resource spec on demand ...
-                res_spec.children[token] = self.register_resource(
-                    res_spec.el_type_uri,
-                    token)
-
-                # ... then repeat same call with res_spec now existing
-                return self._build_events(target_project, res_spec, res_id,
-                                          res_parent_id, request, response,
-                                          path, cursor)
-
-        self._log.warning(
-            "Unexpected continuation of resource path after segment %s: %s",
-            token, request.path)
-        return None
-
-    def register_resource(self, parent_type_uri, token):
+                return res_spec, res_id_pos, res_parent_id_pos, cursor
+
+            # unknown resource name
+            # create resource spec on demand, then repeat with the same
+            # token and the res_spec now existing
+            self.register_resource(res_spec.children, res_spec.el_type_uri,
+                                   token)
+
+        # end of path reached
+        return res_spec, res_id_pos, res_parent_id_pos, None
+
+    def register_resource(self, res_specs, parent_type_uri, token):
         """Register an unknown resource to avoid missed events.
 
         The resulting events are a bit raw but contain enough
         information to understand what happened. This allows for
         incremental improvement.
+
+        Parameters:
+            res_specs: resource tree node to add the resource to
+            parent_type_uri: type URI of the parent CADF resource type
+            token: the resource name used in the URL path
         """
         self._log.warning("unknown resource: %s (created on demand)",
                           token)
@@ -360,13 +543,21 @@ class OpenStackAuditMiddleware(object):
         sub_res_spec, _ = self._build_res_spec(res_name,
                                                parent_type_uri,
                                                res_dict)
+        res_specs[token] = sub_res_spec
+
+        # cached parsing results might be outdated by the new resource, so
+        # invalidate them (only) once it is part of the tree
+        self._registered_resources[0] += 1
+        self._path_cache.clear()
 
         return sub_res_spec
 
-    def _create_events(self, target_project, res_id,
-                       res_parent_id,
-                       res_spec, request, response, suffix=None):
+    def _create_events(self, target_project, res_spec, res_id,
+                       res_parent_id, request, response, suffix=None):
         events = []
+        # these are the same for all events caused by the request
+        event_attrs = self._create_request_event_attributes(request,
+                                                            response)
 
         # check for update operations (POST, PUT, PATCH)
         if request.method[0] == 'P' and response \
@@ -390,7 +581,7 @@ class OpenStackAuditMiddleware(object):
                                                          res_spec,
                                                          res_id,
                                                          res_parent_id,
-                                                         request, response,
+                                                         request, event_attrs,
                                                          subpayload, suffix)
                     pl = next(req_pl) if req_pl else None
                     if ev:
@@ -409,7 +600,7 @@ class OpenStackAuditMiddleware(object):
                                                         res_spec,
                                                         res_id,
                                                         res_parent_id,
-                                                        request, response,
+                                                        request, event_attrs,
                                                         res_payload, suffix)
 
                 if not event:
@@ -428,8 +619,8 @@ class OpenStackAuditMiddleware(object):
                 events.append(event)
         else:
             event = self._create_cadf_event(target_project, res_spec, res_id,
-                                            res_parent_id,
-                                            request, response, suffix)
+                                            res_parent_id, request,
+                                            event_attrs, suffix)
             if not event:
                 return []
 
@@ -448,13 +639,13 @@ class OpenStackAuditMiddleware(object):
         return events
 
     def _create_event_from_payload(self, target_project, res_spec, res_id,
-                                   res_parent_id, request, response,
+                                   res_parent_id, request, event_attrs,
                                    subpayload, suffix=None):
         self._log.debug("create event from payload: %s",
                         self._clean_payload(subpayload, res_spec))
         ev = self._create_cadf_event(target_project, res_spec, res_id,
-                                     res_parent_id, request,
-                                     response, suffix)
+                                     res_parent_id, request, event_attrs,
+                                     suffix)
         if not ev:
             return None
 
@@ -475,38 +666,13 @@ class OpenStackAuditMiddleware(object):
         return ev
 
     def _create_cadf_event(self, project, res_spec, res_id, res_parent_id,
-                           request, response, suffix):
+                           request, event_attrs, suffix):
 
         action, key = self._get_action_and_key(res_spec, res_id, request,
                                                suffix)
         if not action:
             return None
 
-        project_id = request.environ.get('HTTP_X_PROJECT_ID')
-        domain_id = request.environ.get('HTTP_X_DOMAIN_ID')
-        initiator = OpenStackResource(
-            project_id=project_id, domain_id=domain_id,
-            typeURI=taxonomy.ACCOUNT_USER,
-            id=request.environ.get('HTTP_X_USER_ID', taxonomy.UNKNOWN),
-            name=request.environ.get('HTTP_X_USER_NAME', taxonomy.UNKNOWN),
-            domain=request.environ.get('HTTP_X_USER_DOMAIN_NAME',
-                                       taxonomy.UNKNOWN),
-            host=host.Host(address=request.client_addr,
-                           agent=request.user_agent))
-
-        action_result = None
-        event_reason = None
-        if response:
-            if 200 <= response.status_int < 400:
-                action_result = taxonomy.OUTCOME_SUCCESS
-            else:
-                action_result = taxonomy.OUTCOME_FAILURE
-
-            event_reason = reason.Reason(
-                reasonType='HTTP', reasonCode=str(response.status_int))
-        else:
-            action_result = taxonomy.UNKNOWN
-
         target = None
         if res_id or res_parent_id:
             target = self._create_target_resource(project, res_spec, res_id,
@@ -517,16 +683,12 @@ class OpenStackAuditMiddleware(object):
                                                   key=key)
             target.name = self._service_name
 
-        observer = self._create_observer_resource()
-
-        event = eventfactory.EventFactory().new_event(
+        event = self._event_factory.new_event(
             eventType=cadftype.EVENTTYPE_ACTIVITY,
-            outcome=action_result,
             action=action,
-            initiator=initiator,
-            observer=observer,
-            reason=event_reason,
-            target=target)
+            observer=self._observer,
+            target=target,
+            **event_attrs)
         event.requestPath = request.path_qs
 
         # add reporter step again?
@@ -611,6 +773,45 @@ class OpenStackAuditMiddleware(object):
 
         return target
 
+    def _create_request_event_attributes(self, request, response):
+        """Build the event attributes which only depend on the request.
+
+        Those are shared by all events created for the same request, e.g.
+        in bulk operations.
+        """
+        action_result = None
+        event_reason = None
+        if response:
+            if 200 <= response.status_int < 400:
+                action_result = taxonomy.OUTCOME_SUCCESS
+            else:
+                action_result = taxonomy.OUTCOME_FAILURE
+
+            event_reason = reason.Reason(
+                reasonType='HTTP', reasonCode=str(response.status_int))
+        else:
+            action_result = taxonomy.UNKNOWN
+
+        return {'initiator': self._create_initiator_resource(request),
+                'outcome': action_result,
+                'reason': event_reason}
+
+    @staticmethod
+    def _create_initiator_resource(request):
+        """Build the event's initiator element from the request."""
+        env_get = request.environ.get
+        initiator = OpenStackResource(
+            project_id=env_get('HTTP_X_PROJECT_ID'),
+            domain_id=env_get('HTTP_X_DOMAIN_ID'),
+            typeURI=taxonomy.ACCOUNT_USER,
+            id=env_get('HTTP_X_USER_ID', taxonomy.UNKNOWN),
+            name=env_get('HTTP_X_USER_NAME', taxonomy.UNKNOWN),
+            domain=env_get('HTTP_X_USER_DOMAIN_NAME', taxonomy.UNKNOWN),
+            host=host.Host(address=request.client_addr,
+                           agent=request.user_agent))
+
+        return initiator
+
     def _create_observer_resource(self):
         """Build the observer element representing this middleware."""
         observer = resource.Resource(typeURI='service/' + self._service_type,
@@ -645,19 +846,10 @@ class OpenStackAuditMiddleware(object):
     @staticmethod
     def _get_action_from_method(method, res_spec, res_id):
         """Determine the CADF action from the HTTP method."""
-        if method == 'POST':
-            if res_id or res_spec.singleton:
-                return taxonomy.ACTION_UPDATE
-
-            return taxonomy.ACTION_CREATE
-        elif method == 'GET' or method == 'HEAD':
-            if res_id or res_spec.singleton:
-                return taxonomy.ACTION_READ
-            return taxonomy.ACTION_LIST
-        elif method == "PATCH":
-            return taxonomy.ACTION_UPDATE
+        if res_id or res_spec.singleton:
+            return _method_action_map[method]
 
-        return _method_action_map[method]
+        return _collection_method_action_map[method]
 
     def _get_action_and_key_from_path_suffix(self, path_suffix, method,
                                              res_spec, res_id):
@@ -669,9 +861,8 @@ class OpenStackAuditMiddleware(object):
             return action, None
 
         # check for generic mapping
-        rule = method + ':*'
-        if rule in res_spec.custom_actions:
-            action = res_spec.custom_actions.get(rule)
+        if method in res_spec.wildcard_actions:
+            action = res_spec.wildcard_actions[method]
             if action is not None:
                 return action.replace('*', rest_action), None
             else:
@@ -720,16 +911,13 @@ class OpenStackAuditMiddleware(object):
         :return: URL request path without the leading prefix or None if prefix
         was missing and optional target tenant or None
         """
-        g = self._prefix_re.match(request.path)
+        # request.path is computed on every access
+        req_path = request.path
+        g = self._prefix_re.match(req_path)
         if g:
-            path = request.path[g.end():]
-            project = None
-            try:
-                # project needs to be specified in a named group in order to
-                #  be detected
-                project = g.group('project_id')
-            except IndexError:
-                project = None
+            path = req_path[g.end():]
+            project = g.group('project_id') if self._prefix_has_project \
+                else None
 
             return path, project
 
@@ -13,10 +13,12 @@
 """Test the event creation logic."""
 
 import json
+import mock
 import uuid
 
 from pycadf import cadftaxonomy as taxonomy
 
+from auditmiddleware import _api
 from auditmiddleware.tests.unit import base
 
 
@@ -51,6 +53,26 @@ class AuditApiLogicTest(base.BaseAuditMiddlewareTest):
         self.check_event(request, response, event, taxonomy.ACTION_LIST,
                          "compute/server/volume-attachments", rid)
 
+    def test_get_action_cached(self):
+        """Test that parsed paths are reused for other resource IDs."""
+        middleware = _api.OpenStackAuditMiddleware(self.audit_map, False,
+                                                   False)
+        # paths of resources declared in the mapping are known in advance
+        self.assertIn(('servers', None, 'os-interface'), middleware._routes)
+
+        for _ in range(2):
+            rid = str(uuid.uuid4().hex)
+            url = self.build_url('servers', prefix='/v2/' + self.project_id,
+                                 res_id=rid, suffix='detail')
+            request, response = self.build_api_call('GET', url)
+            event = middleware.create_events(request, response)[0].as_dict()
+
+            self.check_event(request, response, event, "read/list/details",
+                             "compute/server", rid)
+
+        self.assertEqual({('servers', None, 'detail')},
+                         set(middleware._path_cache))
+
     def test_get_read(self):
         """Test reading of resources using HTTP GET."""
         rid = str(uuid.uuid4().hex)
@@ -62,6 +84,74 @@ class AuditApiLogicTest(base.BaseAuditMiddlewareTest):
         self.check_event(request, response, event, taxonomy.ACTION_READ,
                          "compute/server", rid)
 
+    def test_get_read_id_registered_as_resource(self):
+        """Test that segments which clearly are IDs are read as IDs.
+
+        This must hold even if an odd path made the middleware register
+        the ID as resource name on demand before.
+        """
+        middleware = _api.OpenStackAuditMiddleware(self.audit_map, False,
+                                                   False)
+        rid = str(uuid.uuid4().hex)
+        rid2 = str(uuid.uuid4().hex)
+        url = self.build_url('servers', prefix='/v2/' + self.project_id,
+                             res_id=rid, child_res=rid2, suffix='unknown')
+        request, response = self.build_api_call('PUT', url)
+        middleware.create_events(request, response)
+
+        url = self.build_url('servers', prefix='/v2/' + self.project_id,
+                             res_id=rid2)
+        request, response = self.build_api_call('GET', url)
+        event = middleware.create_events(request, response)[0].as_dict()
+
+        self.check_event(request, response, event, taxonomy.ACTION_READ,
+                         "compute/server", rid2)
+
+    def test_resolve_path_registration_while_parsing(self):
+        """Test that parsing results are not outdated by registrations.
+
+        Paths parsed while another request registers a resource on demand
+        must not be cached with the old interpretation.
+        """
+        middleware = _api.OpenStackAuditMiddleware(self.audit_map, False,
+                                                   False)
+        rid, rid2, rid3 = [str(uuid.uuid4().hex) for _ in range(3)]
+        build_res_spec = middleware._build_res_spec
+        nested = []
+
+        def register_concurrently(name, parent_type_uri, spec):
+            result = build_res_spec(name, parent_type_uri, spec)
+            if name == 'Xfoo':
+                # another request parses the path before the new resource
+                # has been added to the tree
+                nested.append(middleware._resolve_path(['servers', rid2,
+                                                        'foo']))
+            return result
+
+        with mock.patch.object(middleware, '_build_res_spec',
+                               side_effect=register_concurrently):
+            middleware._resolve_path(['servers', rid, 'foo', 'bar'])
+        self.assertEqual(1, len(nested))
+
+        segments = ['servers', rid3, 'foo']
+        res_spec, _, _, suffix = middleware._resolve_path(segments)
+        route = middleware._build_route(segments, [])
+        self.assertIs(route[0], res_spec)
+        self.assertEqual('compute/server/Xfoo', res_spec.type_uri)
+        self.assertIsNone(route[3])
+        self.assertIsNone(suffix)
+
+    def test_get_read_empty_segments(self):
+        """Test that duplicate and trailing slashes are ignored."""
+        rid = str(uuid.uuid4().hex)
+        url = self.build_url('/servers/', prefix='/v2/' + self.project_id,
+                             res_id=rid) + '/'
+        request, response = self.build_api_call('GET', url)
+        event = self.build_event(request, response)
+
+        self.check_event(request, response, event, taxonomy.ACTION_READ,
+                         "compute/server", rid)
+
     def test_head_read(self):
         """Test existence of resources using HTTP HEAD."""
         rid = str(uuid.uuid4().hex)
@@ -277,6 +367,18 @@ class AuditApiLogicTest(base.BaseAuditMiddlewareTest):
         self.check_event(request, response, event, taxonomy.ACTION_CREATE,
                          "compute/server", rid, rname)
 
+    def test_post_create_no_response_payload(self):
+        """Test resource creation without resulting resource ID.
+
+        Without ID the service itself is the target.
+        """
+        url = self.build_url('servers', prefix='/v2/' + self.project_id)
+        request, response = self.build_api_call('POST', url)
+        event = self.build_event(request, response)
+
+        self.check_event(request, response, event, taxonomy.ACTION_CREATE,
+                         "compute/servers", None, self.service_name)
+
     def test_post_create_rec_payload(self):
         """Test presence of payload attachment."""
         rid = str(uuid.uuid4().hex)
@@ -14,8 +14,10 @@
 """Test proper integration into the paste pipeline of OpenStack services."""
 import fixtures
 import mock
+import os
 import webob
 
+from auditmiddleware import _api
 from auditmiddleware.tests.unit import base
 
 
@@ -97,6 +99,27 @@ class AuditMiddlewareTest(base.BaseAuditMiddlewareTest):
         middleware._process_request(req, webob.response.Response())
         self.assertTrue(self.notifier.notify.called)
 
+    def test_audit_map_cached(self):
+        """Test that the mapping file is only parsed again if modified."""
+        m1 = _api.OpenStackAuditMiddleware(self.audit_map, False, False)
+        m2 = _api.OpenStackAuditMiddleware(self.audit_map, False, False)
+        self.assertIs(m1._resource_specs, m2._resource_specs)
+        # registrations into the shared tree are noticed by all instances
+        m2.register_resource(m2._resource_specs, None, 'unknowns')
+        self.assertEqual(1, m1._registered_resources[0])
+        self.assertIn('unknowns', m1._resource_specs)
+
+        # changing the modification time invalidates the cached mapping
+        st = os.stat(self.audit_map)
+        os.utime(self.audit_map, (st.st_atime, st.st_mtime + 10))
+        m3 = _api.OpenStackAuditMiddleware(self.audit_map, False, False)
+        self.assertIsNot(m1._resource_specs, m3._resource_specs)
+        self.assertEqual(sorted(m1._resource_specs),
+                         sorted(m3._resource_specs) + ['unknowns'])
+        # the outdated mapping is not kept
+        cached = _api._audit_map_cache[os.path.abspath(self.audit_map)]
+        self.assertIs(m3._resource_specs, cached[5])
+
     def test_ignore_req_opt(self):
         """Test that requests can be ignored by HTTP request method."""
         path = '/v2/' + self.project_id + "/servers"